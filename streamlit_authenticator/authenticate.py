@@ -1,7 +1,11 @@
 import jwt
-import bcrypt
+import hmac
+import time
+import json
+import base64
+import hashlib
 import streamlit as st
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 import extra_streamlit_components as stx
 
 from .hasher import Hasher
@@ -10,6 +14,9 @@ from .utils import generate_random_pw
 
 from .exceptions import CredentialsError, ForgotError, RegisterError, ResetError, UpdateError
 
+_COOKIE_MANAGER_KEY = 'streamlit_authenticator_cookie_manager'
+_JWT_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+
 class Authenticate:
     """
     This class will create login, logout, register user, reset password, forgot password, 
@@ -36,12 +43,21 @@ class Authenticate:
             A Validator object that checks the validity of the username, name, and email fields.
         """
         self.credentials = credentials
-        self.credentials['usernames'] = {key.lower(): value for key, value in credentials['usernames'].items()}
+        if any(username != username.lower() for username in credentials['usernames']):
+            self.credentials['usernames'] = {username.lower(): value for username, value in 
+                credentials['usernames'].items()}
         self.cookie_name = cookie_name
         self.key = key
+        self._key_bytes = key.encode() if isinstance(key, str) else key
         self.cookie_expiry_days = cookie_expiry_days
         self.preauthorized = preauthorized
-        self.cookie_manager = stx.CookieManager()
+        # The component must render on every rerun either way, reusing the manager only saves
+        # constructing a new Python object; both calls share a key so the component identity is stable
+        if '_cookie_manager' in st.session_state:
+            self.cookie_manager = st.session_state['_cookie_manager']
+            self.cookie_manager.get_all(key=_COOKIE_MANAGER_KEY)
+        else:
+            self.cookie_manager = st.session_state['_cookie_manager'] = stx.CookieManager(key=_COOKIE_MANAGER_KEY)
         self.validator = validator if validator is not None else Validator()
 
         if 'name' not in st.session_state:
@@ -52,6 +68,8 @@ class Authenticate:
             st.session_state['username'] = None
         if 'logout' not in st.session_state:
             st.session_state['logout'] = None
+        if '_cookie_checked' not in st.session_state:
+            st.session_state['_cookie_checked'] = False
 
     def _token_encode(self) -> str:
         """
@@ -62,9 +80,12 @@ class Authenticate:
         str
             The JWT cookie for passwordless reauthentication.
         """
-        return jwt.encode({'name':st.session_state['name'],
+        payload = json.dumps({'name':st.session_state['name'],
             'username':st.session_state['username'],
-            'exp_date':self.exp_date}, self.key, algorithm='HS256')
+            'exp_date':self.exp_date}, separators=(',', ':')).encode()
+        signing_input = _JWT_HEADER + b'.' + base64.urlsafe_b64encode(payload).rstrip(b'=')
+        signature = hmac.new(self._key_bytes, signing_input, hashlib.sha256).digest()
+        return (signing_input + b'.' + base64.urlsafe_b64encode(signature).rstrip(b'=')).decode()
 
     def _token_decode(self) -> str:
         """
@@ -76,8 +97,8 @@ class Authenticate:
             The decoded JWT cookie for passwordless reauthentication.
         """
         try:
-            return jwt.decode(self.token, self.key, algorithms=['HS256'])
-        except:
+            return jwt.decode(self.token, self._key_bytes, algorithms=['HS256'])
+        except jwt.PyJWTError:
             return False
 
     def _set_exp_date(self) -> str:
@@ -89,41 +110,52 @@ class Authenticate:
         str
             The JWT cookie's expiry timestamp in Unix epoch.
         """
-        return (datetime.utcnow() + timedelta(days=self.cookie_expiry_days)).timestamp()
+        return time.time() + self.cookie_expiry_days * 86400
 
-    def _check_pw(self) -> bool:
+    def _check_pw(self, username: str, password: str) -> bool:
         """
         Checks the validity of the entered password.
 
+        Parameters
+        ----------
+        username: str
+            The entered username.
+        password: str
+            The entered password.
         Returns
         -------
         bool
             The validity of the entered password by comparing it to the hashed password on disk.
         """
-        return bcrypt.checkpw(self.password.encode(), 
-            self.credentials['usernames'][self.username]['password'].encode())
+        return Hasher.check_pw(password, self.credentials['usernames'][username]['password'])
 
     def _check_cookie(self):
         """
         Checks the validity of the reauthentication cookie.
         """
+        if st.session_state['_cookie_checked']:
+            return
         self.token = self.cookie_manager.get(self.cookie_name)
         if self.token is not None:
+            st.session_state['_cookie_checked'] = True
             self.token = self._token_decode()
-            if self.token is not False:
+            if self.token is not False and self.token.keys() >= {'name', 'username', 'exp_date'}:
                 if not st.session_state['logout']:
-                    if self.token['exp_date'] > datetime.utcnow().timestamp():
-                        if 'name' and 'username' in self.token:
-                            st.session_state['name'] = self.token['name']
-                            st.session_state['username'] = self.token['username']
-                            st.session_state['authentication_status'] = True
+                    if self.token['exp_date'] > time.time():
+                        st.session_state['name'] = self.token['name']
+                        st.session_state['username'] = self.token['username']
+                        st.session_state['authentication_status'] = True
     
-    def _check_credentials(self, inplace: bool=True) -> bool:
+    def _check_credentials(self, username: str, password: str, inplace: bool=True) -> bool:
         """
         Checks the validity of the entered credentials.
 
         Parameters
         ----------
+        username: str
+            The entered username.
+        password: str
+            The entered password.
         inplace: bool
             Inplace setting, True: authentication status will be stored in session state, 
             False: authentication status will be returned as bool.
@@ -132,30 +164,20 @@ class Authenticate:
         bool
             Validity of entered credentials.
         """
-        if self.username in self.credentials['usernames']:
-            try:
-                if self._check_pw():
-                    if inplace:
-                        st.session_state['name'] = self.credentials['usernames'][self.username]['name']
-                        self.exp_date = self._set_exp_date()
-                        self.token = self._token_encode()
-                        self.cookie_manager.set(self.cookie_name, self.token,
-                            expires_at=datetime.now() + timedelta(days=self.cookie_expiry_days))
-                        st.session_state['authentication_status'] = True
-                    else:
-                        return True
-                else:
-                    if inplace:
-                        st.session_state['authentication_status'] = False
-                    else:
-                        return False
-            except Exception as e:
-                print(e)
-        else:
-            if inplace:
-                st.session_state['authentication_status'] = False
-            else:
-                return False
+        user = self.credentials['usernames'].get(username)
+        try:
+            valid = user is not None and self._check_pw(username, password)
+            if not inplace:
+                return valid
+            if valid:
+                st.session_state['name'] = user['name']
+                self.exp_date = self._set_exp_date()
+                self.token = self._token_encode()
+                self.cookie_manager.set(self.cookie_name, self.token,
+                    expires_at=datetime.fromtimestamp(self.exp_date, tz=timezone.utc))
+            st.session_state['authentication_status'] = valid
+        except Exception as e:
+            print(e)
 
     def login(self, form_name: str, location: str='main') -> tuple:
         """
@@ -188,12 +210,12 @@ class Authenticate:
                     login_form = st.sidebar.form('Login')
 
                 login_form.subheader(form_name)
-                self.username = login_form.text_input('Username').lower()
-                st.session_state['username'] = self.username
-                self.password = login_form.text_input('Password', type='password')
+                username = login_form.text_input('Username').lower()
+                st.session_state['username'] = username
+                password = login_form.text_input('Password', type='password')
 
                 if login_form.form_submit_button('Login'):
-                    self._check_credentials()
+                    self._check_credentials(username, password)
 
         return st.session_state['name'], st.session_state['authentication_status'], st.session_state['username']
 
@@ -210,20 +232,32 @@ class Authenticate:
         """
         if location not in ['main', 'sidebar']:
             raise ValueError("Location must be one of 'main' or 'sidebar'")
-        if location == 'main':
-            if st.button(button_name, key):
-                self.cookie_manager.delete(self.cookie_name)
-                st.session_state['logout'] = True
-                st.session_state['name'] = None
-                st.session_state['username'] = None
-                st.session_state['authentication_status'] = None
-        elif location == 'sidebar':
-            if st.sidebar.button(button_name, key):
-                self.cookie_manager.delete(self.cookie_name)
-                st.session_state['logout'] = True
-                st.session_state['name'] = None
-                st.session_state['username'] = None
-                st.session_state['authentication_status'] = None
+        container = st if location == 'main' else st.sidebar
+        if container.button(button_name, key):
+            self.cookie_manager.delete(self.cookie_name)
+            st.session_state['_cookie_checked'] = False
+            st.session_state['logout'] = True
+            st.session_state['name'] = None
+            st.session_state['username'] = None
+            st.session_state['authentication_status'] = None
+
+    def _hash_password(self, password: str, message: str) -> str:
+        """
+        Hashes a plain text password while showing a spinner.
+
+        Parameters
+        ----------
+        password: str
+            The plain text password to be hashed.
+        message: str
+            The rendered text of the spinner.
+        Returns
+        -------
+        str
+            The hashed password.
+        """
+        with st.spinner(message):
+            return Hasher([password]).generate()[0]
 
     def _update_password(self, username: str, password: str):
         """
@@ -236,7 +270,7 @@ class Authenticate:
         password: str
             The updated plain text password.
         """
-        self.credentials['usernames'][username]['password'] = Hasher([password]).generate()[0]
+        self.credentials['usernames'][username]['password'] = self._hash_password(password, 'Updating password...')
 
     def reset_password(self, username: str, form_name: str, button_name: str = 'Reset', location: str='main') -> bool:
         """
@@ -265,17 +299,17 @@ class Authenticate:
             reset_password_form = st.sidebar.form('Reset password')
 
         reset_password_form.subheader(form_name)
-        self.username = username.lower()
-        self.password = reset_password_form.text_input('Current password', type='password')
+        username = username.lower()
+        password = reset_password_form.text_input('Current password', type='password')
         new_password = reset_password_form.text_input('New password', type='password')
         new_password_repeat = reset_password_form.text_input('Repeat password', type='password')
 
         if reset_password_form.form_submit_button(button_name):
-            if self._check_credentials(inplace=False):
+            if self._check_credentials(username, password, inplace=False):
                 if len(new_password) > 0:
                     if new_password == new_password_repeat:
-                        if self.password != new_password:
-                            self._update_password(self.username, new_password)
+                        if password != new_password:
+                            self._update_password(username, new_password)
                             return True
                         else:
                             raise ResetError('New and current passwords are the same')
@@ -286,6 +320,26 @@ class Authenticate:
             else:
                 raise CredentialsError
     
+    def _validate_credentials(self, username: str, name: str, email: str):
+        """
+        Checks the validity of the new user's username, name, and email.
+
+        Parameters
+        ----------
+        username: str
+            The username of the new user.
+        name: str
+            The name of the new user.
+        email: str
+            The email of the new user.
+        """
+        if not self.validator.validate_username(username):
+            raise RegisterError('Username is not valid')
+        if not self.validator.validate_name(name):
+            raise RegisterError('Name is not valid')
+        if not self.validator.validate_email(email):
+            raise RegisterError('Email is not valid')
+
     def _register_credentials(self, username: str, name: str, password: str, email: str, preauthorization: bool):
         """
         Adds to credentials dictionary the new user's information.
@@ -304,15 +358,11 @@ class Authenticate:
             The preauthorization requirement, True: user must be preauthorized to register, 
             False: any user can register.
         """
-        if not self.validator.validate_username(username):
-            raise RegisterError('Username is not valid')
-        if not self.validator.validate_name(name):
-            raise RegisterError('Name is not valid')
-        if not self.validator.validate_email(email):
-            raise RegisterError('Email is not valid')
+        self._validate_credentials(username, name, email)
 
+        hashed_password = self._hash_password(password, 'Creating account...')
         self.credentials['usernames'][username] = {'name': name, 
-            'password': Hasher([password]).generate()[0], 'email': email}
+            'password': hashed_password, 'email': email}
         if preauthorization:
             self.preauthorized['emails'].remove(email)
 
@@ -371,6 +421,48 @@ class Authenticate:
             else:
                 raise RegisterError('Please enter an email, username, name, and password')
 
+    def register_users_bulk(self, users: list, preauthorization: bool=False) -> bool:
+        """
+        Registers several new users at once, hashing their passwords concurrently.
+
+        Parameters
+        ----------
+        users: list
+            The list of new users, each a dict with "username", "name", "password", and "email" keys.
+        preauthorization: bool
+            The preauthorization requirement, True: users must be preauthorized to register, 
+            False: any user can register.
+        Returns
+        -------
+        bool
+            The status of registering the new users, True: users registered successfully.
+        """
+        if preauthorization:
+            if not self.preauthorized:
+                raise ValueError("preauthorization argument must not be None")
+        new_usernames, new_emails = set(), set()
+        preauthorized_emails = set(self.preauthorized['emails']) if preauthorization else set()
+        for user in users:
+            username = user['username'].lower()
+            if not (len(user['email']) and len(username) and len(user['name']) and len(user['password']) > 0):
+                raise RegisterError('Please enter an email, username, name, and password')
+            if username in self.credentials['usernames'] or username in new_usernames:
+                raise RegisterError('Username already taken')
+            if preauthorization:
+                if user['email'] not in preauthorized_emails or user['email'] in new_emails:
+                    raise RegisterError('User not preauthorized to register')
+            self._validate_credentials(username, user['name'], user['email'])
+            new_usernames.add(username)
+            new_emails.add(user['email'])
+
+        hashed_passwords = Hasher([user['password'] for user in users]).generate_batch()
+        for user, hashed_password in zip(users, hashed_passwords):
+            self.credentials['usernames'][user['username'].lower()] = {'name': user['name'], 
+                'password': hashed_password, 'email': user['email']}
+            if preauthorization:
+                self.preauthorized['emails'].remove(user['email'])
+        return True
+
     def _set_random_password(self, username: str) -> str:
         """
         Updates credentials dictionary with user's hashed random password.
@@ -384,9 +476,38 @@ class Authenticate:
         str
             New plain text password that should be transferred to user securely.
         """
-        self.random_password = generate_random_pw()
-        self.credentials['usernames'][username]['password'] = Hasher([self.random_password]).generate()[0]
-        return self.random_password
+        random_password = generate_random_pw()
+        self.credentials['usernames'][username]['password'] = self._hash_password(random_password, 
+            'Resetting password...')
+        return random_password
+
+    def reset_passwords_bulk(self, usernames: list) -> list:
+        """
+        Sets random passwords for several users at once, hashing them concurrently.
+
+        Parameters
+        ----------
+        usernames: list
+            Usernames of users to set random passwords for.
+        Returns
+        -------
+        list
+            Tuples of username, email, and new plain text password that should be transferred to each 
+            user securely, in the same order as usernames.
+        """
+        usernames = [username.lower() for username in usernames]
+        if len(set(usernames)) != len(usernames):
+            raise ForgotError('Usernames must not be repeated')
+        for username in usernames:
+            if username not in self.credentials['usernames']:
+                raise ForgotError(f'Username {username} not found')
+
+        random_passwords = [generate_random_pw() for _ in usernames]
+        hashed_passwords = Hasher(random_passwords).generate_batch()
+        for username, hashed_password in zip(usernames, hashed_passwords):
+            self.credentials['usernames'][username]['password'] = hashed_password
+        return [(username, self.credentials['usernames'][username]['email'], random_password) 
+            for username, random_password in zip(usernames, random_passwords)]
 
     def forgot_password(self, form_name: str, location: str='main') -> tuple:
         """
@@ -521,20 +642,20 @@ class Authenticate:
             update_user_details_form = st.sidebar.form('Update user details')
         
         update_user_details_form.subheader(form_name)
-        self.username = username.lower()
+        username = username.lower()
         field = update_user_details_form.selectbox('Field', ['Name', 'Email']).lower()
         new_value = update_user_details_form.text_input('New value')
 
         if update_user_details_form.form_submit_button('Update'):
             if len(new_value) > 0:
-                if new_value != self.credentials['usernames'][self.username][field]:
-                    self._update_entry(self.username, field, new_value)
+                if new_value != self.credentials['usernames'][username][field]:
+                    self._update_entry(username, field, new_value)
                     if field == 'name':
                             st.session_state['name'] = new_value
                             self.exp_date = self._set_exp_date()
                             self.token = self._token_encode()
                             self.cookie_manager.set(self.cookie_name, self.token,
-                            expires_at=datetime.now() + timedelta(days=self.cookie_expiry_days))
+                            expires_at=datetime.fromtimestamp(self.exp_date, tz=timezone.utc))
                     return True
                 else:
                     raise UpdateError('New and current values are the same')
@@ -1,4 +1,7 @@
+import os
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
 
 class Hasher:
     """
@@ -39,4 +42,42 @@ class Hasher:
         list
             The list of hashed passwords.
         """
-        return [self._hash(password) for password in self.passwords]
\ No newline at end of file
+        return [self._hash(password) for password in self.passwords]
+
+    def generate_batch(self, max_workers: int=None) -> list:
+        """
+        Hashes the list of plain text passwords concurrently, bcrypt releases the GIL while hashing.
+
+        Parameters
+        ----------
+        max_workers: int
+            The maximum number of hashing threads, defaults to the number of CPUs.
+        Returns
+        -------
+        list
+            The list of hashed passwords, in the same order as the plain text passwords.
+        """
+        if len(self.passwords) <= 1:
+            return self.generate()
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            return list(executor.map(self._hash, self.passwords))
+
+    @staticmethod
+    def check_pw(password: str, hashed_password: Union[str, bytes]) -> bool:
+        """
+        Checks a plain text password against its hashed counterpart.
+
+        Parameters
+        ----------
+        password: str
+            The plain text password to be checked.
+        hashed_password: str or bytes
+            The hashed password to check against, used as is if already encoded.
+        Returns
+        -------
+        bool
+            The validity of the plain text password.
+        """
+        if isinstance(hashed_password, str):
+            hashed_password = hashed_password.encode()
+        return bcrypt.checkpw(password.encode(), hashed_password)
\ No newline at end of file
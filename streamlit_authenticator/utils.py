@@ -1,5 +1,5 @@
 import string
-import random
+import secrets
 
 def generate_random_pw(length: int=16) -> str:
     """
@@ -15,4 +15,4 @@ def generate_random_pw(length: int=16) -> str:
         The randomly generated password.
     """
     letters = string.ascii_letters + string.digits
-    return ''.join(random.choice(letters) for i in range(length)).replace(' ','')
\ No newline at end of file
+    return ''.join(secrets.choice(letters) for i in range(length)).replace(' ','')
\ No newline at end of file